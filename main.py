@@ -11,22 +11,52 @@ Architecture:
 - /session/generate   → generates the final document once collection is complete
 """
 
+import asyncio
+import os
 import uuid
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 
 from services.config_loader import load_config, list_available_doc_types
 from services.conversation import ConversationAgent
 from services.document_generator import DocumentGenerator
+from services.session_store import SessionStore, RedisSessionStore
 
 
-app = FastAPI(title="Legal Document Generation Platform", version="1.0.0")
+SESSION_TTL_SECONDS = 3600
+SESSION_SWEEP_INTERVAL_SECONDS = 300
 
-# In-memory session store 
-sessions: dict[str, ConversationAgent] = {}
+
+async def _sweep_sessions():
+    """Periodically evict sessions idle past their TTL (in-memory store only)."""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+        sessions.evict_expired()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = None
+    if isinstance(sessions, SessionStore):
+        sweeper = asyncio.create_task(_sweep_sessions())
+    yield
+    if sweeper:
+        sweeper.cancel()
+
+
+app = FastAPI(title="Legal Document Generation Platform", version="1.0.0", lifespan=lifespan)
+
+# Session store: Redis when REDIS_URL is set (multi-worker deployments,
+# survives restarts), otherwise in-memory LRU + TTL
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    sessions = RedisSessionStore(REDIS_URL, ttl=SESSION_TTL_SECONDS)
+else:
+    sessions = SessionStore(maxsize=10_000, ttl=SESSION_TTL_SECONDS)
 doc_generator = DocumentGenerator()
 
 # Mount static files for frontend
@@ -41,6 +71,9 @@ class StartSessionRequest(BaseModel):
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    # Client-generated nonce per send; lets the server tell a retry of this
+    # turn apart from the user legitimately repeating the same text
+    turn_id: Optional[str] = None
 
 class GenerateRequest(BaseModel):
     session_id: str
@@ -56,7 +89,7 @@ async def serve_frontend():
 @app.get("/doc-types")
 async def get_doc_types():
     """Returns all available document types. Config-driven — no code change needed for new types."""
-    return {"doc_types": list_available_doc_types()}
+    return {"doc_types": await list_available_doc_types()}
 
 
 @app.post("/session/start")
@@ -72,10 +105,9 @@ async def start_session(request: StartSessionRequest):
 
     session_id = str(uuid.uuid4())
     agent = ConversationAgent(config)
-    sessions[session_id] = agent
-
-    # Get opening message from agent
-    opening = agent.chat("Hello, I'd like to create a document.")
+    # Get opening message from agent, then persist the session state
+    opening = await agent.chat("Hello, I'd like to create a document.")
+    await sessions.save(session_id, agent)
 
     return {
         "session_id": session_id,
@@ -93,11 +125,12 @@ async def chat(request: ChatRequest):
     Guardrails run before the message hits the LLM.
     Returns the agent's reply and current state.
     """
-    agent = sessions.get(request.session_id)
+    agent = await sessions.get(request.session_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    result = agent.chat(request.message)
+    result = await agent.chat(request.message, turn_id=request.turn_id)
+    await sessions.save(request.session_id, agent)
 
     return {
         "session_id": request.session_id,
@@ -116,9 +149,10 @@ async def generate_document(request: GenerateRequest):
     """
     Generates the final legal document using collected data.
     Only callable once collection is complete.
-    Uses a separate constrained LLM call for drafting.
+    Streams the drafted document as plain text so the client renders it
+    as tokens arrive instead of waiting for the full completion.
     """
-    agent = sessions.get(request.session_id)
+    agent = await sessions.get(request.session_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -129,21 +163,16 @@ async def generate_document(request: GenerateRequest):
         )
 
     doc_type = agent.doc_config.get("document_type")
-    result = doc_generator.generate(doc_type, agent.collected_data)
-
-    return {
-        "session_id": request.session_id,
-        "doc_type": doc_type,
-        "document": result["document"],
-        "missing_fields": result["missing_fields"],
-        "collected_data": result["collected_data"],
-    }
+    return StreamingResponse(
+        doc_generator.generate_stream(doc_type, agent.collected_data),
+        media_type="text/plain; charset=utf-8",
+    )
 
 
 @app.get("/session/{session_id}/status")
 async def session_status(session_id: str):
     """Check status of a session"""
-    agent = sessions.get(session_id)
+    agent = await sessions.get(session_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Session not found")
 
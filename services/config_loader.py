@@ -5,34 +5,92 @@ Adding a new document type = dropping a new YAML file in /config
 No code changes required.
 """
 
+import asyncio
+import copy
+import threading
 import yaml
+from collections import OrderedDict
 from pathlib import Path
 from functools import lru_cache
 from typing import Optional
 
+try:
+    from yaml import CSafeLoader as SafeLoader  # libyaml C loader, much faster
+except ImportError:
+    from yaml import SafeLoader
+
 
 CONFIG_DIR = Path("config")
 
+# Parsed-config cache: path -> (mtime, size, parsed dict).
+# Entries are invalidated when the file's mtime or size changes, so editing
+# a YAML takes effect without a restart. Bounded so it can't grow forever.
+# The lock matters because list_available_doc_types runs load_config from
+# multiple threads; the critical sections are microseconds.
+_CONFIG_CACHE: OrderedDict[str, tuple[float, int, dict]] = OrderedDict()
+_CONFIG_CACHE_MAX = 100
+_CONFIG_CACHE_LOCK = threading.Lock()
+
+# Memoized /doc-types listing, keyed on the config directory's mtime_ns —
+# adding/removing a YAML touches the directory and rebuilds the list.
+_DOC_TYPES_CACHE: Optional[tuple[int, list]] = None
+
 
 
 def load_config(doc_type: str) -> dict:
     config_path = CONFIG_DIR / f"{doc_type}.yaml"
     if not config_path.exists():
         raise FileNotFoundError(f"No config found for document type: '{doc_type}'")
+
+    st = config_path.stat()
+    key = str(config_path)
+    with _CONFIG_CACHE_LOCK:
+        cached = _CONFIG_CACHE.get(key)
+        if cached is not None and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            _CONFIG_CACHE.move_to_end(key)
+            config = cached[2]
+        else:
+            config = None
+    if config is not None:
+        # Deep copy — callers (e.g. ConversationAgent) may mutate the config
+        return copy.deepcopy(config)
+
+    # Parse outside the lock — only the cache bookkeeping needs serializing
     with open(config_path) as f:
-        return yaml.safe_load(f)
+        config = yaml.load(f, Loader=SafeLoader)
+
+    with _CONFIG_CACHE_LOCK:
+        _CONFIG_CACHE[key] = (st.st_mtime, st.st_size, config)
+        _CONFIG_CACHE.move_to_end(key)
+        if len(_CONFIG_CACHE) > _CONFIG_CACHE_MAX:
+            _CONFIG_CACHE.popitem(last=False)
+    return copy.deepcopy(config)
+
+
+async def list_available_doc_types() -> list[dict]:
+    global _DOC_TYPES_CACHE
+
+    dir_mtime = CONFIG_DIR.stat().st_mtime_ns
+    if _DOC_TYPES_CACHE is not None and _DOC_TYPES_CACHE[0] == dir_mtime:
+        return _DOC_TYPES_CACHE[1]
 
+    # Cold start: load all configs concurrently in the thread pool so the
+    # file reads + parses overlap instead of running back to back
+    config_files = sorted(CONFIG_DIR.glob("*.yaml"))
+    configs = await asyncio.gather(
+        *[asyncio.to_thread(load_config, f.stem) for f in config_files],
+        return_exceptions=True,
+    )
 
-def list_available_doc_types() -> list[dict]:
     result = []
-    for config_file in CONFIG_DIR.glob("*.yaml"):
-        try:
-            config = load_config(config_file.stem)
-            result.append({
-                "type": config_file.stem,
-                "display_name": config.get("display_name", config_file.stem),
-                "description": config.get("description", ""),
-            })
-        except Exception as e:
-            print(f"Error loading {config_file.stem}: {e}")  # add this line
+    for config_file, config in zip(config_files, configs):
+        if isinstance(config, Exception):
+            print(f"Error loading {config_file.stem}: {config}")  # add this line
+            continue
+        result.append({
+            "type": config_file.stem,
+            "display_name": config.get("display_name", config_file.stem),
+            "description": config.get("description", ""),
+        })
+    _DOC_TYPES_CACHE = (dir_mtime, result)
     return result
@@ -8,11 +8,27 @@ Conversation Agent Service
 - Detects contradictions and vague inputs via LLM
 """
 
-import os
-import json
-from groq import Groq
+import copy
+import hashlib
+import time
+import uuid
+import orjson
+from typing import Optional
+from services.groq_client import GROQ_CLIENT, groq_call_with_retry
 from services.guardrails import GuardrailsService
 
+# Hard cap on messages resent to Groq each turn. Older turns get folded into
+# one rolling summary message, itself capped at MAX_SUMMARY_CHARS, so prefill
+# cost stays bounded no matter how long the conversation runs.
+MAX_HISTORY_MSGS = 20
+MAX_SUMMARY_CHARS = 2000
+_SUMMARY_HEADER = "Summary of earlier conversation (condensed):"
+
+# For callers that don't send a turn_id nonce, only a repeat of the last
+# message inside this window is treated as a retry — beyond it, identical
+# text is a legitimate new turn (users really do answer "yes" twice in a row)
+RETRY_DEDUPE_WINDOW_SECONDS = 5.0
+
 
 class ConversationAgent:
     def __init__(self, doc_config: dict):
@@ -22,72 +38,163 @@ class ConversationAgent:
         self.conversation_history = []
         self.guardrails = GuardrailsService(doc_config)
         self.is_complete = False
+        self._static_system = None  # built once — byte-stable for prompt caching
+        self._tools = None  # update_fields tool schema, built once per session
+        # Retry dedupe: remember the last processed turn so a double-submit or
+        # client retry doesn't trigger a second LLM call. The frontend tags
+        # each send with a turn_id nonce; _session_key goes into the
+        # Idempotency-Key header so turns from different sessions never
+        # share a key.
+        self._session_key = uuid.uuid4().hex
+        self._turns_processed = 0
+        self._last_turn_id = None
+        self._last_user_message = None
+        self._last_turn_time = 0.0
+        self._last_result = None
 
-        self.client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+        self.client = GROQ_CLIENT  # shared across sessions — reuses keep-alive connections
         self.model = "llama-3.1-8b-instant"  # fast + capable enough for this task
 
     def _build_system_prompt(self) -> str:
-        from datetime import date
-        today = date.today().strftime("%d-%B-%Y")  
-    
+        """
+        The static prompt: rules, field schema, response format. Built once
+        per session and never changes, so provider-side prompt caching can
+        skip re-prefilling it every turn. All per-turn state (collected data,
+        today's date) lives in _dynamic_context instead.
+        """
+        if self._static_system is not None:
+            return self._static_system
+
         fields_list = "\n".join(
             f"- {f['name']}: {f['description']}" for f in self.required_fields
     )
-        collected_summary = json.dumps(self.collected_data, indent=2) if self.collected_data else "Nothing yet"
-
         template = self.doc_config.get("system_prompt", "")
-        prompt = template.format(fields=fields_list, collected=collected_summary)
-    
-    # Inject real date so LLM never guesses
-        prompt += f"\n\nIMPORTANT: Today's actual date is {today}. Use this as the current date for all purposes."
-    
+        prompt = template.format(
+            fields=fields_list,
+            collected="(see the CURRENT STATE message at the end of the conversation)",
+        )
+
+    # One call does reply + extraction: the model records confirmed values
+    # via the update_fields tool instead of us making a second round-trip
+        prompt += """
+
+TOOL USE: Whenever the user explicitly states a value for a required field, call the update_fields tool with those values, setting is_complete=true only once ALL fields are collected.
+- ONLY record a field if the user directly said the value
+- Do NOT infer, guess, or assume any values
+- Do NOT record anything you (the assistant) said
+Always also reply conversationally in your message content."""
+
+        self._static_system = prompt
         return prompt
-    def _extract_collected_fields(self, assistant_message: str) -> None:
+
+    def _build_tools(self) -> list:
+        """Tool schema for structured extraction, built once per session.
+        The fields object mirrors required_fields from the doc config."""
+        if self._tools is not None:
+            return self._tools
+
+        json_types = {"number": "number", "list": "array"}
+        properties = {}
+        for f in self.required_fields:
+            prop = {
+                "type": json_types.get(f.get("type"), "string"),
+                "description": f.get("description", ""),
+            }
+            if prop["type"] == "array":
+                prop["items"] = {"type": "string"}
+            properties[f["name"]] = prop
+
+        self._tools = [{
+            "type": "function",
+            "function": {
+                "name": "update_fields",
+                "description": (
+                    "Record field values the user has explicitly stated, "
+                    "and whether all required fields have been collected."
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "fields": {
+                            "type": "object",
+                            "properties": properties,
+                            "description": "Only values the user directly stated — never inferred.",
+                        },
+                        "is_complete": {
+                            "type": "boolean",
+                            "description": "True only once every required field has been collected.",
+                        },
+                    },
+                    "required": ["fields", "is_complete"],
+                },
+            },
+        }]
+        return self._tools
+
+    def _dynamic_context(self) -> str:
+        """Short per-turn trailer: collected data + real date. Appended at the
+        END of the message list so it never perturbs the cacheable prefix."""
+        from datetime import date
+        today = date.today().strftime("%d-%B-%Y")
+
+        collected_summary = (
+            orjson.dumps(self.collected_data, option=orjson.OPT_INDENT_2).decode()
+            if self.collected_data else "Nothing yet"
+        )
+        return (
+            f"CURRENT STATE\nAlready collected: {collected_summary}\n\n"
+            f"IMPORTANT: Today's actual date is {today}. Use this as the current date for all purposes."
+        )
+
+    def _compact_history(self) -> None:
         """
-        Ask LLM to extract any newly confirmed field values from the conversation.
-        Separate extraction call keeps the main conversation clean.
+        Sliding-window compaction: once the history exceeds MAX_HISTORY_MSGS,
+        fold the oldest whole user/assistant pairs into a single synthetic
+        system message at the head of the history. Confirmed field values
+        already live in collected_data, so the condensed transcript only
+        needs to preserve conversational context.
         """
-        if not self.conversation_history:
+        history = self.conversation_history
+        if len(history) <= MAX_HISTORY_MSGS:
             return
 
-        field_names = [f["name"] for f in self.required_fields]
-        extraction_prompt = f"""
+        # An existing rolling summary sits at index 0 — keep extending it
+        if history and history[0].get("role") == "system":
+            prior = history[0]["content"].removeprefix(_SUMMARY_HEADER).strip()
+            turns = history[1:]
+        else:
+            prior = ""
+            turns = history
 
-Look at this conversation and extract ONLY values that the user has EXPLICITLY stated.
+        overflow = len(turns) - (MAX_HISTORY_MSGS - 1)
+        if overflow % 2:
+            overflow += 1  # drop whole user/assistant pairs
+        dropped, kept = turns[:overflow], turns[overflow:]
 
-Conversation:
-{json.dumps(self.conversation_history, indent=2)}
+        condensed = "\n".join(f"{m['role']}: {m['content'][:200]}" for m in dropped)
+        body = f"{prior}\n{condensed}".strip()
+        # Cap the summary itself — oldest condensed lines fall off the front,
+        # otherwise it would grow by ~2 lines every turn past the window
+        if len(body) > MAX_SUMMARY_CHARS:
+            body = "…" + body[-MAX_SUMMARY_CHARS:]
+        self.conversation_history = [
+            {"role": "system", "content": f"{_SUMMARY_HEADER}\n{body}"},
+            *kept,
+        ]
 
-Fields to extract: {field_names}
+    def _next_field_prompt(self) -> str:
+        """Fallback reply when the model only returns a tool call: ask for the
+        first required field not yet collected, so the flow keeps moving."""
+        for f in self.required_fields:
+            if f["name"] not in self.collected_data:
+                label = f.get("label", f["name"].replace("_", " "))
+                return f"Thanks, I've noted that. Next, could you tell me the {label.lower()}?"
+        return (
+            "Thanks, I've noted that. I believe I have everything I need — "
+            "is there anything you'd like to correct before I finish up?"
+        )
 
-STRICT RULES:
-- ONLY extract a field if the user directly said the value
-- Do NOT infer, guess, or assume any values
-- Do NOT extract anything the assistant said
-- If unsure, leave the field out entirely
-- Return ONLY a JSON object, nothing else
-
-Example: if user said "my name is John", return {{"testator_name": "John"}}
-If user said nothing about a field, do NOT include it. """
-
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": extraction_prompt}],
-                temperature=0,  # deterministic extraction
-                max_tokens=500,
-            )
-            raw = response.choices[0].message.content.strip()
-            # Parse JSON safely
-            start = raw.find("{")
-            end = raw.rfind("}") + 1
-            if start != -1 and end > start:
-                extracted = json.loads(raw[start:end])
-                self.collected_data.update(extracted)
-        except Exception:
-            pass  # extraction failure is non-fatal
-
-    def chat(self, user_message: str) -> dict:
+    async def chat(self, user_message: str, turn_id: Optional[str] = None) -> dict:
         """
         Main entry point. Returns:
         {
@@ -109,37 +216,87 @@ If user said nothing about a field, do NOT include it. """
                 "collected_data": self.collected_data,
             }
 
-        # Step 2: Add user message to history
+        # Step 2: Idempotency — a retry re-sends the turn that was just
+        # processed, so return that turn's snapshot instead of re-calling
+        # Groq and appending a duplicate to the history. The turn_id nonce
+        # distinguishes a retry from a user legitimately repeating the same
+        # text; nonce-less callers only dedupe rapid repeats.
+        if turn_id is not None:
+            is_retry = turn_id == self._last_turn_id
+        else:
+            is_retry = (
+                user_message == self._last_user_message
+                and time.time() - self._last_turn_time < RETRY_DEDUPE_WINDOW_SECONDS
+            )
+        if is_retry and self._last_result is not None:
+            return copy.deepcopy(self._last_result)
+
+        idempotency_key = hashlib.sha256(
+            f"{self._session_key}|{self._turns_processed}|{turn_id or ''}|{user_message}".encode()
+        ).hexdigest()[:32]
+
+        # Step 3: Add user message to history
         self.conversation_history.append({
             "role": "user",
             "content": user_message
         })
 
-        # Step 3: Call LLM with full conversation history
+        # Step 4: Call LLM — static prefix first, per-turn state last, so the
+        # long prefix stays byte-identical across turns and cache-friendly
         messages = [
             {"role": "system", "content": self._build_system_prompt()},
-            *self.conversation_history
+            *self.conversation_history[:-1],
+            {"role": "system", "content": self._dynamic_context()},
+            self.conversation_history[-1],
         ]
 
-        response = self.client.chat.completions.create(
+        response = await groq_call_with_retry(lambda: self.client.chat.completions.create(
             model=self.model,
             messages=messages,
-            temperature=0.2,  
-            max_tokens=400,
-        )
+            temperature=0.2,
+            max_tokens=600,
+            tools=self._build_tools(),  # reply + extraction in one call
+            tool_choice="auto",
+            extra_headers={"Idempotency-Key": idempotency_key},
+        ))
+
+        message = response.choices[0].message
+        assistant_reply = (message.content or "").strip()
 
-        assistant_reply = response.choices[0].message.content.strip()
+        # Step 5: Apply any update_fields tool call — structured extraction,
+        # no free-form JSON to fish out of the reply text
+        for tool_call in (message.tool_calls or []):
+            if tool_call.function.name != "update_fields":
+                continue
+            try:
+                args = orjson.loads(tool_call.function.arguments)
+            except orjson.JSONDecodeError:
+                continue
+            fields = args.get("fields")
+            if isinstance(fields, dict):
+                self.collected_data.update(
+                    {k: v for k, v in fields.items() if v not in (None, "")}
+                )
+            if args.get("is_complete") is True:
+                self.is_complete = True
 
-        # Step 4: Add assistant reply to history
+        # Llama models often return tool calls with empty content despite the
+        # "always also reply" instruction — synthesize a continuation that
+        # asks for the next field so collection doesn't stall
+        if not assistant_reply:
+            assistant_reply = (
+                "COLLECTION_COMPLETE" if self.is_complete else self._next_field_prompt()
+            )
+
+        # Step 6: Add assistant reply (not the raw envelope) to history,
+        # then compact so the next prompt stays bounded
         self.conversation_history.append({
             "role": "assistant",
             "content": assistant_reply
         })
+        self._compact_history()
 
-        # Step 5: Extract any newly confirmed fields
-        self._extract_collected_fields(assistant_reply)
-
-        # Step 6: Check if collection is complete
+        # Step 7: Check if collection is complete
         if "COLLECTION_COMPLETE" in assistant_reply:
             self.is_complete = True
             clean_reply = assistant_reply.replace("COLLECTION_COMPLETE", "").strip()
@@ -147,13 +304,54 @@ If user said nothing about a field, do NOT include it. """
         else:
             clean_reply = assistant_reply
 
-        return {
+        result = {
             "reply": clean_reply,
             "blocked": False,
             "block_reason": None,
             "is_complete": self.is_complete,
             "collected_data": self.collected_data,
         }
+        # Deep-copied snapshot, not live references — a later retry must see
+        # this turn's state even after collected_data has moved on
+        self._last_turn_id = turn_id
+        self._last_user_message = user_message
+        self._last_turn_time = time.time()
+        self._last_result = copy.deepcopy(result)
+        self._turns_processed += 1
+        return result
 
     def get_collected_data(self) -> dict:
         return self.collected_data
+
+    def to_state_dict(self) -> dict:
+        """JSON-serializable snapshot of the session for external storage.
+        Includes the retry-dedupe state: in multi-worker deployments a retry
+        usually lands on a different replica, which must see the same
+        session key, turn bookkeeping, and last-turn snapshot to dedupe it."""
+        return {
+            "doc_type": self.doc_config.get("document_type"),
+            "conversation_history": self.conversation_history,
+            "collected_data": self.collected_data,
+            "is_complete": self.is_complete,
+            "session_key": self._session_key,
+            "turns_processed": self._turns_processed,
+            "last_turn_id": self._last_turn_id,
+            "last_user_message": self._last_user_message,
+            "last_turn_time": self._last_turn_time,
+            "last_result": self._last_result,
+        }
+
+    @classmethod
+    def from_state_dict(cls, state: dict, config: dict) -> "ConversationAgent":
+        """Rebuild an agent from a to_state_dict snapshot + its doc config."""
+        agent = cls(config)
+        agent.conversation_history = state.get("conversation_history", [])
+        agent.collected_data = state.get("collected_data", {})
+        agent.is_complete = state.get("is_complete", False)
+        agent._session_key = state.get("session_key", agent._session_key)
+        agent._turns_processed = state.get("turns_processed", 0)
+        agent._last_turn_id = state.get("last_turn_id")
+        agent._last_user_message = state.get("last_user_message")
+        agent._last_turn_time = state.get("last_turn_time", 0.0)
+        agent._last_result = state.get("last_result")
+        return agent
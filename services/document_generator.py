@@ -8,10 +8,10 @@ Document Generator Service
 - Temperature = 0 for full reproducibility
 """
 
-import os
 import re
+from functools import lru_cache
 from pathlib import Path
-from groq import Groq
+from services.groq_client import GROQ_CLIENT, groq_call_with_retry
 
 
 DRAFTER_SYSTEM_PROMPT = """You are a legal document drafter. Your job is to fill in a legal document template using ONLY the data provided.
@@ -27,9 +27,35 @@ STRICT RULES:
 """
 
 
+# Matches unfilled {{field}} placeholders left after the simple fill
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+
+
+class _SafeDict(dict):
+    """format_map mapping that leaves unknown placeholders intact as {{key}},
+    so missing-field detection after the fill still works."""
+    def __missing__(self, key):
+        return "{{" + key + "}}"
+
+
+@lru_cache(maxsize=64)
+def _load_template_cached(path: str, mtime_ns: int) -> str:
+    """Read a template file once per (path, mtime) — mtime in the key means
+    an edited template is re-read without a restart."""
+    return Path(path).read_text()
+
+
+@lru_cache(maxsize=64)
+def _prepare_template(template: str) -> str:
+    """Convert a {{field}} template to str.format syntax ({field}) with all
+    literal braces escaped, so one format_map pass fills every placeholder."""
+    escaped = template.replace("{", "{{").replace("}", "}}")
+    return re.sub(r"\{\{\{\{(\w+)\}\}\}\}", r"{\1}", escaped)
+
+
 class DocumentGenerator:
     def __init__(self):
-        self.client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+        self.client = GROQ_CLIENT  # shared across sessions — reuses keep-alive connections
         self.model = "llama-3.3-70b-versatile"  # larger model for better document quality
         self.templates_dir = Path("templates")
 
@@ -37,20 +63,20 @@ class DocumentGenerator:
         template_path = self.templates_dir / f"{doc_type}.txt"
         if not template_path.exists():
             raise FileNotFoundError(f"Template not found: {template_path}")
-        return template_path.read_text()
+        return _load_template_cached(str(template_path), template_path.stat().st_mtime_ns)
 
     def _simple_fill(self, template: str, data: dict) -> str:
-        """Simple placeholder replacement for fields that don't need LLM"""
-        result = template
+        """Simple placeholder replacement for fields that don't need LLM.
+        Single format_map pass — no per-field rescans of the template."""
+        values = _SafeDict()
         for key, value in data.items():
             if isinstance(value, list):
-                formatted = "\n".join(f"  {i+1}. {item}" for i, item in enumerate(value))
-                result = result.replace(f"{{{{{key}}}}}", formatted)
+                values[key] = "\n".join(f"  {i+1}. {item}" for i, item in enumerate(value))
             else:
-                result = result.replace(f"{{{{{key}}}}}", str(value) if value else "Not specified")
-        return result
+                values[key] = str(value) if value else "Not specified"
+        return _prepare_template(template).format_map(values)
 
-    def generate(self, doc_type: str, collected_data: dict) -> dict:
+    async def generate(self, doc_type: str, collected_data: dict) -> dict:
         """
         Generate the final legal document.
         Returns: { "document": str, "method": str, "missing_fields": list }
@@ -59,7 +85,18 @@ class DocumentGenerator:
 
         # Find any unfilled placeholders after simple fill
         simple_filled = self._simple_fill(template, collected_data)
-        missing = re.findall(r"\{\{(\w+)\}\}", simple_filled)
+        missing = _PLACEHOLDER_RE.findall(simple_filled)
+
+        # Every placeholder filled (lists already formatted by _simple_fill):
+        # the document is done — no need for a multi-second 70B call to do
+        # what was pure string substitution
+        if not missing:
+            return {
+                "document": simple_filled,
+                "method": "template_only",
+                "missing_fields": [],
+                "collected_data": collected_data,
+            }
 
         # Use LLM to intelligently fill and format the document
         prompt = f"""Fill in the following legal document template using ONLY this data:
@@ -72,7 +109,7 @@ TEMPLATE (fill all {{{{field_name}}}} placeholders):
 
 Return the complete filled document."""
 
-        response = self.client.chat.completions.create(
+        response = await groq_call_with_retry(lambda: self.client.chat.completions.create(
             model=self.model,
             messages=[
                 {"role": "system", "content": DRAFTER_SYSTEM_PROMPT},
@@ -80,7 +117,7 @@ Return the complete filled document."""
             ],
             temperature=0,  # fully deterministic — same input = same output always
             max_tokens=2000,
-        )
+        ))
 
         document = response.choices[0].message.content.strip()
 
@@ -90,3 +127,43 @@ Return the complete filled document."""
             "missing_fields": missing,
             "collected_data": collected_data,
         }
+
+    async def generate_stream(self, doc_type: str, collected_data: dict):
+        """
+        Streaming variant of generate(): yields document text chunks as the
+        drafter produces them, so the client sees the first tokens in
+        hundreds of ms instead of waiting for the full completion.
+        """
+        template = self._load_template(doc_type)
+
+        simple_filled = self._simple_fill(template, collected_data)
+        missing = _PLACEHOLDER_RE.findall(simple_filled)
+
+        # Fully filled by the template pass — emit it directly, no LLM call
+        if not missing:
+            yield simple_filled
+            return
+
+        prompt = f"""Fill in the following legal document template using ONLY this data:
+
+COLLECTED DATA:
+{collected_data}
+
+TEMPLATE (fill all {{{{field_name}}}} placeholders):
+{template}
+
+Return the complete filled document."""
+
+        response = await groq_call_with_retry(lambda: self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": DRAFTER_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0,  # fully deterministic — same input = same output always
+            max_tokens=2000,
+            stream=True,
+        ))
+
+        async for chunk in response:
+            yield chunk.choices[0].delta.content or ""
@@ -0,0 +1,49 @@
+"""
+Shared Groq Client
+One process-wide async Groq client instead of one per session.
+All sessions reuse the same httpx connection pool, so DNS + TLS handshakes
+to api.groq.com happen once per worker rather than once per session, and
+awaiting completions keeps the event loop free while the LLM responds.
+"""
+
+import asyncio
+import os
+import random
+import httpx
+from groq import AsyncGroq, RateLimitError
+
+
+GROQ_CLIENT = AsyncGroq(
+    api_key=os.environ.get("GROQ_API_KEY"),
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=20,
+            keepalive_expiry=300,
+        ),
+        http2=True,
+        timeout=httpx.Timeout(30.0, read=180.0),
+    ),
+)
+
+
+async def groq_call_with_retry(coro_factory, max_retries: int = 5):
+    """
+    Run a Groq completion coroutine, retrying on rate limits (429) with
+    exponential backoff + jitter. Honors Groq's Retry-After header when
+    present. coro_factory is called fresh per attempt since a coroutine
+    can only be awaited once.
+    """
+    for attempt in range(max_retries):
+        try:
+            return await coro_factory()
+        except RateLimitError as e:
+            if attempt == max_retries - 1:
+                raise
+            try:
+                # Clamp server-supplied waits too — never hold a request
+                # (and its pooled connection) longer than the backoff cap
+                delay = min(float(e.response.headers["retry-after"]), 30)
+            except (AttributeError, KeyError, TypeError, ValueError):
+                delay = min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+            await asyncio.sleep(delay)
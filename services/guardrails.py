@@ -12,6 +12,17 @@ class GuardrailsService:
     def __init__(self, doc_config: dict):
         self.advice_keywords = doc_config.get("guardrails", {}).get("advice_keywords", [])
         self.injection_patterns = doc_config.get("guardrails", {}).get("injection_patterns", [])
+        # Precompile each keyword list into one alternation regex so check()
+        # is a single C-level scan instead of a Python loop per message
+        self._injection_re = self._compile_patterns(self.injection_patterns)
+        self._advice_re = self._compile_patterns(self.advice_keywords)
+
+    @staticmethod
+    def _compile_patterns(patterns: list) -> Optional[re.Pattern]:
+        lowered = [p.lower() for p in patterns if p]
+        if not lowered:
+            return None
+        return re.compile("|".join(map(re.escape, lowered)))
 
     def check(self, user_message: str) -> Optional[str]:
         """
@@ -21,21 +32,19 @@ class GuardrailsService:
         msg_lower = user_message.lower()
 
         # 1. Prompt injection detection
-        for pattern in self.injection_patterns:
-            if pattern.lower() in msg_lower:
-                return (
-                    "⚠️ I'm unable to process that request. "
-                    "I can only help you collect information for your legal document."
-                )
+        if self._injection_re and self._injection_re.search(msg_lower):
+            return (
+                "⚠️ I'm unable to process that request. "
+                "I can only help you collect information for your legal document."
+            )
 
         # 2. Advice-seeking detection
-        for keyword in self.advice_keywords:
-            if keyword.lower() in msg_lower:
-                return (
-                    "I'm not able to provide legal advice. "
-                    "I can only help collect information for your document. "
-                    "Please consult a qualified solicitor for legal guidance."
-                )
+        if self._advice_re and self._advice_re.search(msg_lower):
+            return (
+                "I'm not able to provide legal advice. "
+                "I can only help collect information for your document. "
+                "Please consult a qualified solicitor for legal guidance."
+            )
 
         return None  # all clear
 
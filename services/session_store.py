@@ -0,0 +1,94 @@
+"""
+Session Store
+Two interchangeable backends behind the same async get/save interface:
+
+- SessionStore: in-process, LRU-bounded with a per-entry TTL. Memory stays
+  O(active sessions) instead of O(all sessions ever).
+- RedisSessionStore: session state serialized to Redis with a TTL, so any
+  worker or replica can serve any session and a restart loses nothing.
+  Selected by setting REDIS_URL.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from services.config_loader import load_config
+
+
+class SessionStore:
+    """
+    LRU-bounded mapping of session_id -> agent with a per-entry TTL.
+    Every get/save refreshes the entry's recency and last-access timestamp;
+    expired entries are dropped on access and by the periodic sweeper, and
+    the least-recently-used entry is evicted when the store is full.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+
+    async def get(self, session_id: str) -> Optional[object]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        last_access, agent = entry
+        if time.monotonic() - last_access > self.ttl:
+            del self._entries[session_id]
+            return None
+        self._entries[session_id] = (time.monotonic(), agent)
+        self._entries.move_to_end(session_id)
+        return agent
+
+    async def save(self, session_id: str, agent: object) -> None:
+        self._entries[session_id] = (time.monotonic(), agent)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def evict_expired(self) -> int:
+        """Drop every entry past its TTL. Returns how many were removed."""
+        cutoff = time.monotonic() - self.ttl
+        expired = [sid for sid, (ts, _) in self._entries.items() if ts < cutoff]
+        for sid in expired:
+            self._entries.pop(sid, None)
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisSessionStore:
+    """
+    Redis-backed store. Agents are serialized via to_state_dict/from_state_dict
+    and stored with a TTL, so session continuity survives restarts and scales
+    across workers. Redis expires keys itself — no sweeper needed.
+    """
+
+    def __init__(self, url: str, ttl: int = 3600):
+        import redis.asyncio as aioredis  # optional dependency, needed only with REDIS_URL
+        self.ttl = ttl
+        self._redis = aioredis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    async def get(self, session_id: str) -> Optional[object]:
+        from services.conversation import ConversationAgent
+
+        raw = await self._redis.get(self._key(session_id))
+        if raw is None:
+            return None
+        state = json.loads(raw)
+        config = load_config(state["doc_type"])
+        return ConversationAgent.from_state_dict(state, config)
+
+    async def save(self, session_id: str, agent: object) -> None:
+        await self._redis.set(
+            self._key(session_id),
+            json.dumps(agent.to_state_dict()),
+            ex=self.ttl,
+        )